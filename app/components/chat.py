@@ -2,16 +2,51 @@
 Chat component for displaying and managing chat messages.
 """
 from typing import List, Dict, Any, Optional
+import html
+import time
 import streamlit as st
 from datetime import datetime
 
 from app.tools.exact_match import MatchResult
 from app.tools.semantic_qa import QAResult
 
+def _source_block(text: str, page_number: Optional[Any] = None) -> str:
+    """
+    Render one source document block, escaping the PDF text.
+    
+    Args:
+        text: Source text
+        page_number: Optional page number shown as the block title
+        
+    Returns:
+        HTML for the block
+    """
+    title = f"<strong>Page {html.escape(str(page_number))}</strong>" if page_number is not None else ""
+    return f'<div class="source-document">{title}<p>{html.escape(text)}</p></div>'
+
+def render_sources_html(sources: List[Dict[str, Any]]) -> str:
+    """
+    Render message sources as a single HTML block.
+    
+    Args:
+        sources: Source dictionaries with page number and content/snippet
+        
+    Returns:
+        HTML for all sources
+    """
+    return "\n".join(
+        _source_block(
+            source.get('content') or source.get('snippet') or 'No content available',
+            source.get('page_number', 'N/A')
+        )
+        for source in sources
+    )
+
 def display_chat_message(
     role: str,
     content: str,
-    sources: Optional[List[Dict[str, Any]]] = None
+    sources: Optional[List[Dict[str, Any]]] = None,
+    sources_html: Optional[str] = None
 ):
     """
     Display a chat message with optional sources.
@@ -20,6 +55,7 @@ def display_chat_message(
         role: Message role ('user' or 'assistant')
         content: Message content
         sources: Optional source documents
+        sources_html: Optional pre-rendered HTML for the sources
     """
     # Create a container for the message
     message_container = st.container()
@@ -30,16 +66,10 @@ def display_chat_message(
             
             if sources:
                 with st.expander("📄 View Sources", expanded=False):
-                    for source in sources:
-                        st.markdown(
-                            f"""
-                            <div class="source-document">
-                                <strong>Page {source.get('page_number', 'N/A')}</strong>
-                                <p>{source.get('content', source.get('snippet', 'No content available'))}</p>
-                            </div>
-                            """,
-                            unsafe_allow_html=True
-                        )
+                    st.markdown(
+                        sources_html or render_sources_html(sources),
+                        unsafe_allow_html=True
+                    )
 
 def display_exact_match_result(result: MatchResult):
     """
@@ -56,15 +86,53 @@ def display_exact_match_result(result: MatchResult):
                 f"📄 Page {match['page_number']} ({match['count']} matches)",
                 expanded=False
             ):
-                for snippet in match['snippets']:
-                    st.markdown(
-                        f"""
-                        <div class="source-document">
-                            <p>{snippet}</p>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
+                st.markdown(
+                    "\n".join(_source_block(snippet) for snippet in match['snippets']),
+                    unsafe_allow_html=True
+                )
+
+def _qa_sources_html(result: QAResult) -> str:
+    """Render a QA result's sources, caching the HTML on the result."""
+    cached = getattr(result, "_sources_html", None)
+    if cached is None:
+        cached = "\n".join(
+            _source_block(doc.page_content, doc.metadata.get('page_number', 'N/A'))
+            for doc in result.source_documents
+        )
+        result._sources_html = cached
+    return cached
+
+def update_streaming_placeholder(
+    placeholder: Any,
+    text: str | List[str],
+    final: bool = False,
+    interval: float = 0.1
+):
+    """
+    Update a streaming placeholder at most once per interval.
+    
+    Re-rendering on every token re-sends the whole accumulated answer, so
+    updates are throttled; paragraph breaks and the final update are
+    always rendered. A list of tokens is only joined when it is rendered.
+    
+    Args:
+        placeholder: Streamlit placeholder to update
+        text: Full text streamed so far, or the list of tokens
+        final: Whether this is the completed response
+        interval: Minimum number of seconds between updates
+    """
+    now = time.monotonic()
+    last = st.session_state.get("_md_last", 0.0)
+    tail = text if isinstance(text, str) else "".join(text[-2:])
+    
+    if final or now - last >= interval or tail.endswith("\n\n"):
+        if not isinstance(text, str):
+            text = "".join(text)
+        if final:
+            placeholder.markdown(text)
+        else:
+            placeholder.text(text)
+        st.session_state._md_last = now
 
 def display_qa_result(
     result: QAResult,
@@ -80,32 +148,45 @@ def display_qa_result(
         placeholder: Optional streamlit placeholder for streaming
     """
     if streaming and placeholder:
-        placeholder.markdown(result.answer)
+        update_streaming_placeholder(placeholder, result.answer, final=True)
     else:
         st.markdown(result.answer)
         
     if result.source_documents:
         with st.expander("📄 View Sources", expanded=False):
-            for doc in result.source_documents:
-                st.markdown(
-                    f"""
-                    <div class="source-document">
-                        <strong>Page {doc.metadata.get('page_number', 'N/A')}</strong>
-                        <p>{doc.page_content}</p>
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
+            st.markdown(_qa_sources_html(result), unsafe_allow_html=True)
 
 def init_session_state():
     """Initialize session state variables."""
     if "messages" not in st.session_state:
         st.session_state.messages = []
-    if "current_response" not in st.session_state:
-        st.session_state.current_response = ""
+    if "_response_buffer" not in st.session_state:
+        st.session_state._response_buffer = []
+
+def _display_message(message: Dict[str, Any]):
+    """Display a stored message using its pre-rendered sources HTML."""
+    display_chat_message(
+        role=message["role"],
+        content=message["content"],
+        sources=message.get("sources"),
+        sources_html=message.get("_sources_html")
+    )
 
+def _display_pair(prompt: Dict[str, Any], response: Optional[Dict[str, Any]]):
+    """Display a prompt and its response, if any."""
+    with st.container():
+        _display_message(prompt)
+    if response is not None:
+        with st.container():
+            _display_message(response)
+
+@st.fragment
 def display_chat_history():
-    """Display the chat history."""
+    """
+    Display the chat history.
+    
+    Runs as a fragment so it can be re-run without the rest of the page.
+    """
     messages = st.session_state.get("messages", [])
     
     if not messages:
@@ -119,36 +200,35 @@ def display_chat_history():
         )
         return
     
-    # Display messages in reverse order but keep prompt-response pairs together
-    for i in range(len(messages) - 1, -1, -2):
-        if i > 0:  # If we have both prompt and response
-            # Display prompt
-            with st.container():
-                display_chat_message(
-                    role=messages[i - 1]["role"],
-                    content=messages[i - 1]["content"],
-                    sources=messages[i - 1].get("sources")
-                )
-            # Display response
-            with st.container():
-                display_chat_message(
-                    role=messages[i]["role"],
-                    content=messages[i]["content"],
-                    sources=messages[i].get("sources")
-                )
-        else:  # If we only have a prompt (shouldn't happen in normal flow)
-            with st.container():
-                display_chat_message(
-                    role=messages[i]["role"],
-                    content=messages[i]["content"],
-                    sources=messages[i].get("sources")
-                )
+    # Display messages in reverse order but keep prompt-response pairs
+    # together; pairing by role keeps a prompt left without a response (e.g.
+    # after a failed query) from shifting the pairs after it
+    pairs = []
+    for message in messages:
+        prompt, response = pairs[-1] if pairs else (None, None)
+        if (
+            message["role"] == "assistant"
+            and prompt is not None
+            and prompt["role"] == "user"
+            and response is None
+        ):
+            pairs[-1] = (prompt, message)
+        else:
+            pairs.append((message, None))
+    
+    for prompt, response in reversed(pairs):
+        _display_pair(prompt, response)
 
 def add_message(role: str, content: str, sources: Optional[List[Dict[str, Any]]] = None):
-    """Add a message to the chat history."""
+    """
+    Add a message to the chat history.
+    
+    The sources HTML is rendered here, once, so reruns only re-emit it.
+    """
     st.session_state.messages.append({
         "role": role,
         "content": content,
         "sources": sources or [],
+        "_sources_html": render_sources_html(sources) if sources else None,
         "timestamp": datetime.now().isoformat()
     }) 
\ No newline at end of file
@@ -1,7 +1,8 @@
 """
 Agent module for intelligent query routing between tools.
 """
-from typing import Dict, Any, Optional, Union
+from typing import Dict, Any, List, Optional, Union
+import asyncio
 import logging
 import re
 from dataclasses import dataclass
@@ -11,6 +12,17 @@ from langchain_openai import ChatOpenAI
 from langchain.memory import ConversationBufferMemory
 from langchain_core.prompts import ChatPromptTemplate
 
+try:
+    import ahocorasick
+except ImportError:  # optional accelerator
+    ahocorasick = None
+
+try:
+    import numpy as np
+    import onnxruntime
+except ImportError:  # optional local router
+    onnxruntime = None
+
 from app.tools.exact_match import ExactMatchTool, MatchResult
 from app.tools.semantic_qa import SemanticQATool, QAResult
 
@@ -66,6 +78,120 @@ EXACT_MATCH_PATTERNS = [
     r"search for.*exact",
 ]
 
+# Patterns above that need regex features; everything else is a plain literal
+WILDCARD_PATTERNS = [p for p in EXACT_MATCH_PATTERNS if ".*" in p]
+LITERAL_PATTERNS = [p for p in EXACT_MATCH_PATTERNS if p not in WILDCARD_PATTERNS]
+
+class ExactMatchDetector:
+    """
+    Detects exact match phrasing in a question.
+    
+    Literal patterns are scanned with an Aho-Corasick automaton when
+    pyahocorasick is installed (plain substring checks otherwise), so the
+    scan is a single pass over the question regardless of pattern count.
+    The few wildcard patterns are kept in a small compiled regex.
+    """
+    
+    def __init__(self):
+        """Build the literal matcher and the wildcard regex."""
+        self.literals = tuple(p.lower() for p in LITERAL_PATTERNS)
+        self.automaton = None
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for literal in self.literals:
+                self.automaton.add_word(literal, literal)
+            self.automaton.make_automaton()
+        self.wildcard_pattern = re.compile(
+            "|".join(WILDCARD_PATTERNS),
+            re.IGNORECASE
+        )
+    
+    def search(self, question: str) -> bool:
+        """
+        Check whether a question contains any exact match phrasing.
+        
+        Args:
+            question: User's question
+            
+        Returns:
+            True if any pattern matches
+        """
+        text = question.lower()
+        if self.automaton is not None:
+            # The first hit is enough
+            for _ in self.automaton.iter(text):
+                return True
+        elif any(literal in text for literal in self.literals):
+            return True
+        return self.wildcard_pattern.search(text) is not None
+
+# Capturing patterns for common exact match phrasings; group 1 is the search term
+SEARCH_TERM_PATTERNS = [
+    r"\bhow\s+(?:many\s+times|often|frequently)\s+(?:does|do|is|are|was|were)\b\s+(.+?)\s+\b(?:appear|occur|show up|mentioned|used)",
+    r"\bwhere\s+(?:does|do|is|are)\b\s+(.+?)\s+\b(?:appear|occur|mentioned|used)",
+    r"\b(?:count|occurrences|instances|mentions|number)\s+of\s+(?:(?:times|mentions|occurrences|instances)(?:\s+of)?\s+)?(.+?)(?:\s+\b(?:in|within|throughout|appears?|occurs?|are\s+there|is\s+there|exists?)\b|[?.!]|$)",
+    r"^\s*(?:does|do|is|are)\b\s+(.+?)\s+\b(?:appear|occur|mentioned)",
+]
+
+# Captured terms that refer to something else rather than naming the term
+SEARCH_TERM_PRONOUNS = frozenset({
+    "it", "its", "they", "them", "this", "that", "these", "those",
+    "he", "she", "there", "one", "ones"
+})
+
+# Longer captures are usually clauses, not search terms
+SEARCH_TERM_MAX_WORDS = 4
+
+# Leading words that describe the term rather than being part of it
+SEARCH_TERM_PREFIX = re.compile(
+    r"^(?:the\s+)?(?:(?:word|term|phrase|text|name)s?\s+)?",
+    re.IGNORECASE
+)
+
+class LocalRouter:
+    """
+    Local ONNX classifier that routes queries without an LLM call.
+    
+    The model takes a string tensor of questions (shape [batch]) as its
+    first input, and its last output holds class probabilities of shape
+    [batch, 2] ordered as (EXACT_MATCH, SEMANTIC_QA).
+    """
+    
+    LABELS = ('EXACT_MATCH', 'SEMANTIC_QA')
+    
+    def __init__(self, model_path: str, threshold: float = 0.8):
+        """
+        Load the classifier.
+        
+        Args:
+            model_path: Path to the ONNX model
+            threshold: Minimum probability to accept a prediction
+        """
+        if onnxruntime is None:
+            raise ImportError("onnxruntime is required for local routing")
+        self.session = onnxruntime.InferenceSession(model_path)
+        self.input_name = self.session.get_inputs()[0].name
+        self.threshold = threshold
+    
+    def predict(self, questions: List[str]) -> List[Optional[str]]:
+        """
+        Classify questions.
+        
+        Args:
+            questions: User questions
+            
+        Returns:
+            Tool identifiers, or None where the model is not confident
+        """
+        outputs = self.session.run(
+            None,
+            {self.input_name: np.array(questions, dtype=object)}
+        )
+        return [
+            self.LABELS[int(p.argmax())] if p.max() >= self.threshold else None
+            for p in np.asarray(outputs[-1])
+        ]
+
 @dataclass
 class QueryResult:
     """Container for query results."""
@@ -79,7 +205,9 @@ class QueryRouter:
         self,
         exact_match_tool: ExactMatchTool,
         semantic_qa_tool: SemanticQATool,
-        llm: Optional[BaseLLM] = None
+        llm: Optional[BaseLLM] = None,
+        local_router_path: Optional[str] = None,
+        local_router_threshold: float = 0.8
     ):
         """
         Initialize the query router.
@@ -88,6 +216,9 @@ class QueryRouter:
             exact_match_tool: Tool for exact matching
             semantic_qa_tool: Tool for semantic Q&A
             llm: Language model for routing (defaults to OpenAI)
+            local_router_path: Optional ONNX routing classifier, consulted
+                before falling back to the LLM
+            local_router_threshold: Minimum classifier confidence to skip the LLM
         """
         self.exact_match_tool = exact_match_tool
         self.semantic_qa_tool = semantic_qa_tool
@@ -95,11 +226,28 @@ class QueryRouter:
             model_name="gpt-3.5-turbo",
             temperature=0
         )
-        self.exact_match_pattern = re.compile(
-            "|".join(EXACT_MATCH_PATTERNS),
-            re.IGNORECASE
-        )
+        self.exact_match_detector = ExactMatchDetector()
+        self.search_term_patterns = [
+            re.compile(pattern, re.IGNORECASE)
+            for pattern in SEARCH_TERM_PATTERNS
+        ]
         self.routing_prompt = ChatPromptTemplate.from_template(ROUTING_PROMPT)
+        self.local_router = None
+        if local_router_path:
+            try:
+                self.local_router = LocalRouter(local_router_path, local_router_threshold)
+            except Exception as e:
+                logger.warning(f"Local router unavailable, using LLM routing: {e}")
+    
+    def _local_predictions(self, questions: List[str]) -> List[Optional[str]]:
+        """Run the local classifier, returning None for unresolved questions."""
+        if not self.local_router or not questions:
+            return [None] * len(questions)
+        try:
+            return self.local_router.predict(questions)
+        except Exception as e:
+            logger.error(f"Error in local routing: {e}")
+            return [None] * len(questions)
     
     def _determine_tool(self, question: str) -> str:
         """
@@ -113,24 +261,94 @@ class QueryRouter:
         """
         try:
             # First check for exact match patterns
-            if self.exact_match_pattern.search(question):
+            if self.exact_match_detector.search(question):
                 return 'EXACT_MATCH'
             
-            # If no pattern match, use LLM for more nuanced decision
+            # Then the local classifier, if it is confident
+            prediction = self._local_predictions([question])[0]
+            if prediction:
+                return prediction
+            
+            # Otherwise use LLM for more nuanced decision
             response = self.llm.invoke(
                 self.routing_prompt.format_messages(question=question)
-            ).content.strip()
-            
-            if response not in ['EXACT_MATCH', 'SEMANTIC_QA']:
-                logger.warning(f"Invalid routing response: {response}")
-                return 'SEMANTIC_QA'  # Default to semantic QA
-                
-            return response
+            )
+            return self._parse_routing_response(response)
             
         except Exception as e:
             logger.error(f"Error in tool determination: {e}")
             return 'SEMANTIC_QA'  # Default to semantic QA on error
     
+    def _parse_routing_response(self, response: Any) -> str:
+        """
+        Convert a routing LLM response into a tool identifier.
+        
+        Args:
+            response: Raw LLM response (message or string)
+            
+        Returns:
+            Tool identifier ('EXACT_MATCH' or 'SEMANTIC_QA')
+        """
+        decision = getattr(response, "content", response).strip()
+        
+        if decision not in ['EXACT_MATCH', 'SEMANTIC_QA']:
+            logger.warning(f"Invalid routing response: {decision}")
+            return 'SEMANTIC_QA'  # Default to semantic QA
+            
+        return decision
+    
+    def determine_tools(
+        self,
+        questions: List[str],
+        max_concurrency: Optional[int] = None
+    ) -> List[str]:
+        """
+        Determine which tool to use for several queries at once.
+        
+        Questions matching exact match patterns (or confidently classified
+        by the local router) are resolved locally; the rest are routed with
+        a single batched LLM call.
+        
+        Args:
+            questions: User questions
+            max_concurrency: Optional cap on concurrent LLM requests
+            
+        Returns:
+            Tool identifiers aligned with the input questions
+        """
+        tools: List[Optional[str]] = [None] * len(questions)
+        remaining = []
+        
+        for i, question in enumerate(questions):
+            if self.exact_match_detector.search(question):
+                tools[i] = 'EXACT_MATCH'
+            else:
+                remaining.append(i)
+        
+        predictions = self._local_predictions([questions[i] for i in remaining])
+        for i, prediction in zip(remaining, predictions):
+            tools[i] = prediction
+        remaining = [i for i in remaining if tools[i] is None]
+        
+        if remaining:
+            try:
+                config = {"max_concurrency": max_concurrency} if max_concurrency else None
+                responses = self.llm.batch(
+                    [
+                        self.routing_prompt.format_messages(question=questions[i])
+                        for i in remaining
+                    ],
+                    config=config
+                )
+                for i, response in zip(remaining, responses):
+                    tools[i] = self._parse_routing_response(response)
+            except Exception as e:
+                logger.error(f"Error in batch tool determination: {e}")
+                for i in remaining:
+                    tools[i] = 'SEMANTIC_QA'  # Default to semantic QA on error
+        
+        return tools
+    
     def _extract_search_term(self, question: str) -> str:
         """
         Extract search term from question for exact matching.
@@ -164,7 +382,12 @@ class QueryRouter:
                 # Return the first quoted string found
                 return quoted[0]
             
-            # If no quotes, use LLM
+            # Then try the common phrasings
+            term = self._match_search_term(question)
+            if term:
+                return term
+            
+            # Only ambiguous questions need the LLM
             return self.llm.invoke(
                 prompt.format_messages(question=question)
             ).content.strip().strip('"\'')
@@ -172,10 +395,33 @@ class QueryRouter:
             logger.error(f"Error extracting search term: {e}")
             return question
     
+    def _match_search_term(self, question: str) -> Optional[str]:
+        """
+        Extract a search term using the precompiled phrasing patterns.
+        
+        Args:
+            question: User's question
+            
+        Returns:
+            Extracted search term, or None if no pattern applies
+        """
+        for pattern in self.search_term_patterns:
+            match = pattern.search(question)
+            if not match:
+                continue
+            term = SEARCH_TERM_PREFIX.sub("", match.group(1).strip())
+            term = term.strip(" \t\"'?.!,;:")
+            # Pronouns and long clauses are left to the LLM
+            if term.lower() in SEARCH_TERM_PRONOUNS or len(term.split()) > SEARCH_TERM_MAX_WORDS:
+                continue
+            if term:
+                return term
+        return None
+    
     def process_query(
         self,
         question: str,
-        file_path: str,
+        file_path: Union[str, bytes],
         streaming_callback: Optional[callable] = None,
         force_tool: Optional[str] = None
     ) -> QueryResult:
@@ -184,7 +430,7 @@ class QueryRouter:
         
         Args:
             question: User's question
-            file_path: Path to the PDF file
+            file_path: Path to the PDF file, or its bytes
             streaming_callback: Optional callback for streaming responses
             force_tool: Optional tool to use ('EXACT_MATCH' or 'SEMANTIC_QA')
             
@@ -213,6 +459,84 @@ class QueryRouter:
             logger.error(f"Error processing query: {e}")
             raise
     
+    async def aprocess_query(
+        self,
+        question: str,
+        file_path: Union[str, bytes],
+        streaming_callback: Optional[callable] = None,
+        force_tool: Optional[str] = None
+    ) -> QueryResult:
+        """
+        Process a query without blocking the event loop.
+        
+        Routing and exact matching run in a worker thread; semantic QA
+        uses the tool's async API.
+        
+        Args:
+            question: User's question
+            file_path: Path to the PDF file, or its bytes
+            streaming_callback: Optional callback for streaming responses
+            force_tool: Optional tool to use ('EXACT_MATCH' or 'SEMANTIC_QA')
+            
+        Returns:
+            QueryResult containing tool used and result
+        """
+        try:
+            # Determine which tool to use
+            tool = force_tool or await asyncio.to_thread(self._determine_tool, question)
+            
+            if tool == 'EXACT_MATCH':
+                search_term = await asyncio.to_thread(self._extract_search_term, question)
+                result = await asyncio.to_thread(
+                    self.exact_match_tool.count_matches,
+                    file_path=file_path,
+                    query=search_term
+                )
+            else:  # SEMANTIC_QA
+                result = await self.semantic_qa_tool.aask(
+                    question=question,
+                    streaming_callback=streaming_callback
+                )
+            
+            return QueryResult(tool_used=tool, result=result)
+            
+        except Exception as e:
+            logger.error(f"Error processing query: {e}")
+            raise
+    
+    def process_queries(
+        self,
+        questions: List[str],
+        file_path: Union[str, bytes],
+        force_tool: Optional[str] = None,
+        max_concurrency: Optional[int] = None
+    ) -> List[QueryResult]:
+        """
+        Process several queries, routing them in a single batch.
+        
+        Args:
+            questions: User questions
+            file_path: Path to the PDF file, or its bytes
+            force_tool: Optional tool to use for every question
+            max_concurrency: Optional cap on concurrent routing requests
+            
+        Returns:
+            QueryResults aligned with the input questions
+        """
+        if force_tool:
+            tools = [force_tool] * len(questions)
+        else:
+            tools = self.determine_tools(questions, max_concurrency=max_concurrency)
+        
+        return [
+            self.process_query(
+                question=question,
+                file_path=file_path,
+                force_tool=tool
+            )
+            for question, tool in zip(questions, tools)
+        ]
+    
     def clear_chat_history(self) -> None:
         """Clear the semantic QA chat history."""
         self.semantic_qa_tool.clear_memory()
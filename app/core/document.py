@@ -1,107 +1,312 @@
 """
 Document processing module for PDF handling and text chunking.
 """
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional, Tuple, Union, BinaryIO
+from collections import namedtuple
 from pathlib import Path
+import hashlib
 import logging
+import os
+import threading
 
+from cachetools import LRUCache
 from langchain_community.document_loaders import PyPDFLoader
+from langchain_community.document_loaders.parsers.pdf import PyPDFParser
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
+from langchain_core.documents.base import Blob
+
+try:
+    import xxhash
+except ImportError:  # optional accelerator
+    xxhash = None
 
 logger = logging.getLogger(__name__)
 
+# Tokenizer used to measure chunk sizes (matches the OpenAI chat/embedding models)
+TOKEN_ENCODING = "cl100k_base"
+
+# Lightweight read-only view of a page: 1-based number, text and its length
+PageView = namedtuple("PageView", "number text length")
+
+# A PDF given as a file path, its raw bytes or a binary stream
+PDFSource = Union[str, Path, bytes, BinaryIO]
+
+# Parsed pages and page views per source_key, shared by all processors
+_PAGE_CACHE: LRUCache = LRUCache(maxsize=8)
+_PAGE_CACHE_LOCK = threading.Lock()
+
+def _content_hash(text: str) -> int:
+    """Hash normalized chunk text for duplicate detection."""
+    data = text.strip().lower().encode("utf-8")
+    if xxhash is not None:
+        return xxhash.xxh64(data).intdigest()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+def _strip_repeated_edges(text: str, seen_headers: set, seen_footers: set) -> str:
+    """
+    Remove header/footer lines that already appeared on an earlier page.
+    
+    The first and last non-empty lines of each page are remembered; when a
+    later page starts or ends with the same line it is dropped, so repeated
+    running headers and footers are only kept once.
+    
+    Args:
+        text: Page text
+        seen_headers: First lines of previous pages (updated in place)
+        seen_footers: Last lines of previous pages (updated in place)
+        
+    Returns:
+        Page text without repeated edge lines
+    """
+    lines = text.splitlines()
+    content = [i for i, line in enumerate(lines) if line.strip()]
+    if len(content) < 2:
+        return text
+    
+    first, last = content[0], content[-1]
+    header, footer = lines[first].strip(), lines[last].strip()
+    
+    if header in seen_headers:
+        lines[first] = ""
+    else:
+        seen_headers.add(header)
+    if footer in seen_footers:
+        lines[last] = ""
+    else:
+        seen_footers.add(footer)
+    
+    return "\n".join(lines)
+
+def _read_source(source: PDFSource) -> str | bytes:
+    """Resolve a PDF source to an absolute path string or the PDF bytes."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        # BytesIO.getvalue() returns everything regardless of position
+        if hasattr(source, "getvalue"):
+            return source.getvalue()
+        # Rewind so the same handle can be passed to several calls;
+        # non-seekable streams can only be read once
+        if source.seekable():
+            source.seek(0)
+        return source.read()
+    return str(Path(source).resolve())
+
+def _data_key(data: str | bytes) -> Tuple:
+    """Cache key for a resolved source (see source_key)."""
+    if isinstance(data, bytes):
+        return ("sha256", hashlib.sha256(data).hexdigest())
+    stat = os.stat(data)
+    return ("path", data, stat.st_mtime_ns, stat.st_size)
+
+def source_key(source: PDFSource) -> Tuple:
+    """
+    Get a cache key identifying a PDF's content.
+    
+    Files are keyed by path, modification time and size, so a changed file
+    is re-parsed; in-memory PDFs are keyed by the SHA-256 of their bytes.
+    
+    Args:
+        source: PDF file path, bytes or binary stream
+        
+    Returns:
+        Hashable key
+    """
+    return _data_key(_read_source(source))
+
+def _parse_pages(data: str | bytes) -> Iterator[Document]:
+    """Lazily parse the pages of a resolved source, numbering them from 1."""
+    if isinstance(data, bytes):
+        pages = PyPDFParser().lazy_parse(Blob.from_data(data))
+    else:
+        pages = PyPDFLoader(data).lazy_load()
+    
+    # Add page numbers to metadata
+    for i, page in enumerate(pages):
+        page.metadata["page_number"] = i + 1
+        yield page
+
+def _load_pdf_cached(data: str | bytes) -> Tuple[Tuple[Document, ...], Tuple[PageView, ...]]:
+    """
+    Parse a PDF once per source_key and build its page views.
+    
+    Args:
+        data: Resolved source (absolute path string or PDF bytes)
+        
+    Returns:
+        Tuple of page documents and the matching tuple of page views
+    """
+    key = _data_key(data)
+    with _PAGE_CACHE_LOCK:
+        cached = _PAGE_CACHE.get(key)
+    if cached is None:
+        pages = tuple(_parse_pages(data))
+        views = tuple(
+            PageView(page.metadata["page_number"], page.page_content, len(page.page_content))
+            for page in pages
+        )
+        cached = (pages, views)
+        with _PAGE_CACHE_LOCK:
+            _PAGE_CACHE[key] = cached
+    return cached
+
 class PDFProcessor:
     """Handles PDF document loading, parsing, and chunking."""
     
     def __init__(
         self,
-        chunk_size: int = 1000,
-        chunk_overlap: int = 200,
-        separators: List[str] = ["\n\n", "\n", " ", ""]
+        chunk_size: int = 250,
+        chunk_overlap: int = 50,
+        separators: List[str] = ["\n\n", "\n", " ", ""],
+        deduplicate: bool = True
     ):
         """
         Initialize the PDF processor.
         
         Args:
-            chunk_size: Size of text chunks for processing
-            chunk_overlap: Overlap between chunks
+            chunk_size: Size of text chunks in tokens
+            chunk_overlap: Overlap between chunks in tokens
             separators: List of separators for text splitting
+            deduplicate: Whether to drop repeated headers/footers and
+                duplicate chunks before they are embedded
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
         self.separators = separators
-        self.text_splitter = RecursiveCharacterTextSplitter(
+        self.deduplicate = deduplicate
+        # Lengths are measured with tiktoken's native encoder; tiktoken keeps
+        # one shared instance per encoding across all processors
+        self.text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
+            encoding_name=TOKEN_ENCODING,
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap,
             separators=separators
         )
     
-    def load_pdf(self, file_path: str | Path) -> List[Document]:
+    def load_pdf(self, file_path: PDFSource) -> List[Document]:
         """
         Load and process a PDF file.
         
+        Parsed pages are cached by source_key, so repeated calls for an
+        unchanged file (or the same bytes) do not re-parse it.
+        
         Args:
-            file_path: Path to the PDF file
+            file_path: Path to the PDF file, or its bytes or a binary stream
             
         Returns:
             List of processed document chunks with metadata
         """
         try:
-            loader = PyPDFLoader(str(file_path))
-            pages = loader.load()
+            pages, _ = _load_pdf_cached(_read_source(file_path))
             
-            # Add page numbers to metadata
-            for i, page in enumerate(pages):
-                page.metadata["page_number"] = i + 1
+            # Return a fresh list so callers can reorder or extend it freely
+            return list(pages)
+        except Exception as e:
+            logger.error(f"Error loading PDF file: {e}")
+            raise
+    
+    def load_page_views(self, file_path: PDFSource) -> Tuple[PageView, ...]:
+        """
+        Load the pages of a PDF file as PageView tuples.
+        
+        The views are built once per unchanged file and the same tuple is
+        returned to every caller, so it must not be modified.
+        
+        Args:
+            file_path: Path to the PDF file, or its bytes or a binary stream
+            
+        Returns:
+            Page views in page order
+        """
+        try:
+            _, views = _load_pdf_cached(_read_source(file_path))
+            return views
+        except Exception as e:
+            logger.error(f"Error loading PDF file: {e}")
+            raise
+    
+    def iter_pages(self, file_path: PDFSource) -> Iterator[Document]:
+        """
+        Lazily load a PDF file one page at a time.
+        
+        Unlike load_pdf, pages are not cached and only one page needs to be
+        held in memory at a time.
+        
+        Args:
+            file_path: Path to the PDF file, or its bytes or a binary stream
             
-            return pages
+        Yields:
+            Page documents with page numbers in their metadata
+        """
+        try:
+            yield from _parse_pages(_read_source(file_path))
         except Exception as e:
             logger.error(f"Error loading PDF file: {e}")
             raise
     
     def process_pdf(
         self,
-        file_path: str | Path,
+        file_path: PDFSource,
         metadata: Optional[Dict] = None
-    ) -> List[Document]:
+    ) -> Iterator[Document]:
         """
         Load and chunk a PDF file with metadata.
         
+        Pages are streamed and split one at a time, so chunks can be
+        consumed (e.g. embedded) before the whole document is parsed.
+        
+        With deduplication enabled, running headers/footers are stripped
+        from every page after the first one they appear on, and chunks
+        whose normalized text was already emitted are skipped; the page is
+        instead appended to the kept chunk's "page_numbers" metadata.
+        
         Args:
-            file_path: Path to the PDF file
+            file_path: Path to the PDF file, or its bytes or a binary stream
             metadata: Additional metadata to add to each chunk
             
-        Returns:
-            List of processed document chunks
+        Yields:
+            Processed document chunks
         """
-        pages = self.load_pdf(file_path)
+        seen_headers: set = set()
+        seen_footers: set = set()
+        seen_chunks: Dict[int, Document] = {}
         
-        # Split pages into chunks
-        chunks = []
-        for page in pages:
-            page_chunks = self.text_splitter.split_documents([page])
+        for page in self.iter_pages(file_path):
+            text = page.page_content
+            if self.deduplicate:
+                text = _strip_repeated_edges(text, seen_headers, seen_footers)
             
-            # Preserve page numbers and add custom metadata
-            for chunk in page_chunks:
+            # Page numbers are carried over from the page metadata
+            for chunk in self.text_splitter.create_documents(
+                [text],
+                metadatas=[page.metadata]
+            ):
+                if self.deduplicate:
+                    key = _content_hash(chunk.page_content)
+                    kept = seen_chunks.get(key)
+                    if kept is not None:
+                        kept.metadata["page_numbers"].append(page.metadata["page_number"])
+                        continue
+                    chunk.metadata["page_numbers"] = [page.metadata["page_number"]]
+                    seen_chunks[key] = chunk
+                
                 if metadata:
                     chunk.metadata.update(metadata)
-                chunks.append(chunk)
-        
-        return chunks
+                yield chunk
     
-    def get_page_content(self, file_path: str | Path, page_number: int) -> str:
+    def get_page_content(self, file_path: PDFSource, page_number: int) -> str:
         """
         Get the raw content of a specific page.
         
         Args:
-            file_path: Path to the PDF file
+            file_path: Path to the PDF file, or its bytes or a binary stream
             page_number: Page number (1-based)
             
         Returns:
             Raw text content of the page
         """
-        pages = self.load_pdf(file_path)
+        pages = self.load_page_views(file_path)
         if 1 <= page_number <= len(pages):
-            return pages[page_number - 1].page_content
+            return pages[page_number - 1].text
         raise ValueError(f"Page number {page_number} out of range") 
\ No newline at end of file
@@ -1,62 +1,320 @@
 """
 Vector store module for document embeddings and similarity search using FAISS.
 """
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterable, Iterator, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import asyncio
 import logging
+import threading
 from pathlib import Path
 
+import faiss
+from cachetools import LRUCache, TTLCache
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
 from langchain.embeddings.base import Embeddings
+from langchain.embeddings import CacheBackedEmbeddings
+from langchain.storage import LocalFileStore
 
 logger = logging.getLogger(__name__)
 
+# Default embedding model; text-embedding-3 vectors can be truncated with
+# little quality loss, and 512 dimensions use a third of the memory of 1536
+DEFAULT_EMBEDDING_MODEL = "text-embedding-3-small"
+DEFAULT_EMBEDDING_DIMENSIONS = 512
+
+# Supported scalar quantization formats for large (HNSW) indexes; int8
+# keeps a quarter of the float32 memory at a small recall cost
+SCALAR_QUANTIZERS = {
+    "fp16": faiss.ScalarQuantizer.QT_fp16,
+    "int8": faiss.ScalarQuantizer.QT_8bit,
+}
+
+_embedding_loop: Optional[asyncio.AbstractEventLoop] = None
+_embedding_loop_lock = threading.Lock()
+
+def _get_embedding_loop() -> asyncio.AbstractEventLoop:
+    """
+    Get the background event loop that runs embedding requests.
+    
+    Async embedding clients pool their connections on the loop they were
+    first used on, so every request goes through this one long-lived loop
+    instead of a fresh (and then closed) loop per call.
+    """
+    global _embedding_loop
+    with _embedding_loop_lock:
+        if _embedding_loop is None:
+            _embedding_loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_embedding_loop.run_forever,
+                name="embedding-loop",
+                daemon=True
+            ).start()
+        return _embedding_loop
+
 class VectorStoreManager:
     """Manages document embeddings and similarity search using FAISS."""
     
     def __init__(
         self,
         embedding_model: Optional[Embeddings] = None,
-        persist_directory: Optional[str] = None
+        persist_directory: Optional[str] = None,
+        batch_size: int = 1000,
+        max_concurrency: int = 8,
+        ann_threshold: int = 1000,
+        hnsw_m: int = 32,
+        ef_construction: int = 200,
+        quantization: Optional[str] = "int8",
+        search_cache_size: int = 1000,
+        search_cache_ttl: float = 300.0,
+        query_cache_size: int = 512
     ):
         """
         Initialize the vector store manager.
         
         Args:
             embedding_model: LangChain embeddings model (defaults to OpenAI)
-            persist_directory: Directory to persist the vector store
+            persist_directory: Directory to persist the vector store; also
+                enables an on-disk embedding cache in its emb_cache folder
+            batch_size: Number of texts per embedding request
+            max_concurrency: Maximum number of embedding requests in flight
+            ann_threshold: Minimum number of vectors before switching from a
+                flat (exact) index to HNSW; below it the flat scan is faster
+            hnsw_m: Number of HNSW graph neighbours per vector
+            ef_construction: HNSW build-time search depth
+            quantization: Scalar quantization for HNSW-sized indexes (one of
+                SCALAR_QUANTIZERS; "int8" quarters and "fp16" halves vector
+                memory, None keeps float32); smaller indexes stay exact
+            search_cache_size: Maximum number of cached similarity searches
+            search_cache_ttl: Seconds a cached similarity search stays valid
+            query_cache_size: Maximum number of memoized query embeddings
         """
-        self.embedding_model = embedding_model or OpenAIEmbeddings()
+        if quantization and quantization not in SCALAR_QUANTIZERS:
+            raise ValueError(f"Unsupported quantization: {quantization}")
+        
+        # 1000 inputs per request is the OpenAI embeddings API maximum
+        embedding_model = embedding_model or OpenAIEmbeddings(
+            model=DEFAULT_EMBEDDING_MODEL,
+            dimensions=DEFAULT_EMBEDDING_DIMENSIONS,
+            chunk_size=1000
+        )
+        # Queries bypass the on-disk cache, which is meant for document chunks
+        self.query_model = embedding_model
+        if persist_directory:
+            # Content-addressed cache so unchanged chunks are never re-embedded;
+            # the namespace keeps vectors of different models/sizes apart
+            namespace = getattr(embedding_model, "model", type(embedding_model).__name__)
+            dimensions = getattr(embedding_model, "dimensions", None)
+            if dimensions:
+                namespace = f"{namespace}-{dimensions}"
+            embedding_model = CacheBackedEmbeddings.from_bytes_store(
+                embedding_model,
+                LocalFileStore(str(Path(persist_directory) / "emb_cache")),
+                namespace=namespace
+            )
+        self.embedding_model = embedding_model
         self.persist_directory = persist_directory
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.ann_threshold = ann_threshold
+        self.hnsw_m = hnsw_m
+        self.ef_construction = ef_construction
+        self.quantization = quantization
         self.vector_store = None
+        
+        # Results of unfiltered searches, cleared whenever the index changes
+        self._search_cache = TTLCache(maxsize=search_cache_size, ttl=search_cache_ttl)
+        self._search_lock = threading.RLock()
+        # Query embeddings only depend on the model, so they outlive the index
+        self._query_embeddings = LRUCache(maxsize=query_cache_size)
     
-    def create_vector_store(
+    def clear_search_cache(self) -> None:
+        """Drop all cached similarity search results."""
+        with self._search_lock:
+            self._search_cache.clear()
+    
+    def _iter_batches(self, documents: Iterable[Document]) -> Iterator[List[Document]]:
+        """Yield documents in lists that fill every concurrent embedding request."""
+        iterator = iter(documents)
+        window = self.batch_size * self.max_concurrency
+        while batch := list(islice(iterator, window)):
+            yield batch
+    
+    async def _aembed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts with concurrent batched requests.
+        
+        Args:
+            texts: Texts to embed
+            
+        Returns:
+            Embedding vectors aligned with the input texts
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def embed_batch(batch: List[str]) -> List[List[float]]:
+            async with semaphore:
+                return await self.embedding_model.aembed_documents(batch)
+        
+        results = await asyncio.gather(*(
+            embed_batch(texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ))
+        return [vector for result in results for vector in result]
+    
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, overlapping requests when no event loop is running.
+        
+        Args:
+            texts: Texts to embed
+            
+        Returns:
+            Embedding vectors aligned with the input texts
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run_coroutine_threadsafe(
+                self._aembed_texts(texts),
+                _get_embedding_loop()
+            ).result()
+        
+        # Already inside an event loop; fall back to the blocking client
+        return self.embedding_model.embed_documents(texts)
+    
+    def embed_query(self, query: str) -> List[float]:
+        """
+        Embed a search query, memoizing recent queries.
+        
+        Args:
+            query: Search query text
+            
+        Returns:
+            Query embedding vector
+        """
+        with self._search_lock:
+            cached = self._query_embeddings.get(query)
+        if cached is None:
+            cached = tuple(self.query_model.embed_query(query))
+            with self._search_lock:
+                self._query_embeddings[query] = cached
+        return list(cached)
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed several search queries with one request for the uncached ones.
+        
+        Only OpenAI embeddings treat queries and documents alike and can
+        batch them through embed_documents; other models embed the uncached
+        queries one at a time.
+        
+        Args:
+            queries: Search query texts
+            
+        Returns:
+            Query embeddings aligned with the input queries
+        """
+        with self._search_lock:
+            cached: Dict[str, Tuple[float, ...]] = {
+                query: self._query_embeddings[query]
+                for query in queries
+                if query in self._query_embeddings
+            }
+        missing = list(dict.fromkeys(q for q in queries if q not in cached))
+        if missing:
+            if isinstance(self.query_model, OpenAIEmbeddings):
+                vectors = self.query_model.embed_documents(missing)
+            else:
+                vectors = [self.query_model.embed_query(query) for query in missing]
+            with self._search_lock:
+                for query, vector in zip(missing, vectors):
+                    cached[query] = self._query_embeddings[query] = tuple(vector)
+        return [list(cached[query]) for query in queries]
+    
+    def add_batch(
         self,
         documents: List[Document],
         metadatas: Optional[List[Dict[str, Any]]] = None
+    ) -> None:
+        """
+        Embed a batch of documents and add it to the store, creating it if needed.
+        
+        The batch is embedded in one pass (split into concurrent requests of
+        batch_size texts) and written to FAISS with a single bulk add. The
+        ANN index is not rebuilt and nothing is persisted; use
+        create_vector_store or add_documents for that.
+        
+        Args:
+            documents: Documents to add
+            metadatas: Optional metadata overriding each document's own
+        """
+        # Extract text and metadata in a single pass
+        texts = []
+        doc_metadatas = []
+        for doc in documents:
+            texts.append(doc.page_content)
+            doc_metadatas.append(doc.metadata)
+        
+        # Embed once and hand the vectors to FAISS directly
+        text_embeddings = list(zip(texts, self._embed_texts(texts)))
+        
+        if self.vector_store is None:
+            self.vector_store = FAISS.from_embeddings(
+                text_embeddings=text_embeddings,
+                embedding=self.embedding_model,
+                metadatas=metadatas or doc_metadatas
+            )
+        else:
+            self.vector_store.add_embeddings(
+                text_embeddings,
+                metadatas=metadatas or doc_metadatas
+            )
+        self.clear_search_cache()
+    
+    def create_vector_store(
+        self,
+        documents: Iterable[Document],
+        metadatas: Optional[Iterable[Dict[str, Any]]] = None
     ) -> FAISS:
         """
         Create a new vector store from documents.
         
+        Documents may be any iterable (e.g. the generator returned by
+        PDFProcessor.process_pdf); they are consumed in windows of
+        batch_size * max_concurrency and each window is embedded with
+        concurrent requests.
+        
+        If persist_directory already holds a saved index, it is loaded
+        instead and the documents are not consumed.
+        
         Args:
-            documents: List of documents to embed
+            documents: Documents to embed
             metadatas: Optional metadata for each document
             
         Returns:
             FAISS vector store instance
         """
+        if self.persist_directory and (Path(self.persist_directory) / "index.faiss").exists():
+            logger.info(f"Reusing vector store from {self.persist_directory}")
+            return self.load_vector_store()
+        
         try:
-            # Extract text and metadata from documents
-            texts = [doc.page_content for doc in documents]
-            if not metadatas:
-                metadatas = [doc.metadata for doc in documents]
+            self.vector_store = None
+            metadata_iter = iter(metadatas) if metadatas else None
             
-            self.vector_store = FAISS.from_texts(
-                texts=texts,
-                embedding=self.embedding_model,
-                metadatas=metadatas
-            )
+            for batch in self._iter_batches(documents):
+                self.add_batch(
+                    batch,
+                    list(islice(metadata_iter, len(batch))) if metadata_iter else None
+                )
+            
+            if self.vector_store is None:
+                raise ValueError("No documents to index")
+            
+            self._build_ann_index()
             
             if self.persist_directory:
                 self.save_vector_store()
@@ -66,6 +324,36 @@ class VectorStoreManager:
             logger.error(f"Error creating vector store: {e}")
             raise
     
+    def _build_ann_index(self) -> None:
+        """
+        Replace a large flat index with an HNSW index over the same vectors.
+        
+        With quantization set, the HNSW graph stores scalar-quantized
+        vectors instead of full float32 ones.
+        """
+        index = self.vector_store.index
+        if index.ntotal < self.ann_threshold or not isinstance(index, faiss.IndexFlat):
+            return
+        
+        vectors = index.reconstruct_n(0, index.ntotal)
+        if self.quantization:
+            hnsw_index = faiss.IndexHNSWSQ(
+                index.d,
+                SCALAR_QUANTIZERS[self.quantization],
+                self.hnsw_m,
+                index.metric_type
+            )
+        else:
+            hnsw_index = faiss.IndexHNSWFlat(index.d, self.hnsw_m, index.metric_type)
+        hnsw_index.hnsw.efConstruction = self.ef_construction
+        hnsw_index.train(vectors)
+        hnsw_index.add(vectors)
+        
+        # Vector ids are unchanged, so the docstore mapping stays valid
+        self.vector_store.index = hnsw_index
+        self.clear_search_cache()
+        logger.info(f"Built HNSW index over {index.ntotal} vectors")
+    
     def save_vector_store(self, directory: Optional[str] = None) -> None:
         """
         Save the vector store to disk.
@@ -102,10 +390,13 @@ class VectorStoreManager:
             raise ValueError("No persist directory specified")
             
         try:
+            # The index is only ever written by save_vector_store
             self.vector_store = FAISS.load_local(
                 load_path,
-                self.embedding_model
+                self.embedding_model,
+                allow_dangerous_deserialization=True
             )
+            self.clear_search_cache()
             return self.vector_store
         except Exception as e:
             logger.error(f"Error loading vector store: {e}")
@@ -115,55 +406,115 @@ class VectorStoreManager:
         self,
         query: str,
         k: int = 4,
-        filter: Optional[Dict[str, Any]] = None
+        filter: Optional[Dict[str, Any]] = None,
+        ef_search: Optional[int] = None,
+        embedding: Optional[List[float]] = None
     ) -> List[Document]:
         """
         Perform similarity search on the vector store.
         
+        Unfiltered results are cached per (query, k, ef_search) for
+        search_cache_ttl seconds; the cache is cleared whenever documents
+        are added or the index is rebuilt or reloaded.
+        
         Args:
             query: Search query text
             k: Number of results to return
             filter: Optional metadata filter
+            ef_search: Optional HNSW search depth (higher is slower but more
+                accurate); ignored for flat indexes
+            embedding: Optional precomputed query embedding; by default the
+                memoized embed_query result is used
             
         Returns:
             List of similar documents with scores
         """
         if not self.vector_store:
             raise ValueError("No vector store available")
+        
+        key = (query, k, ef_search)
+        if filter is None:
+            with self._search_lock:
+                cached = self._search_cache.get(key)
+            if cached is not None:
+                return list(cached)
             
         try:
-            return self.vector_store.similarity_search(
-                query,
+            if ef_search is not None and isinstance(self.vector_store.index, faiss.IndexHNSW):
+                self.vector_store.index.hnsw.efSearch = ef_search
+            
+            results = self.vector_store.similarity_search_by_vector(
+                embedding if embedding is not None else self.embed_query(query),
                 k=k,
                 filter=filter
             )
+            
+            if filter is None:
+                with self._search_lock:
+                    self._search_cache[key] = tuple(results)
+            return results
         except Exception as e:
             logger.error(f"Error performing similarity search: {e}")
             raise
     
+    def similarity_search_batch(
+        self,
+        queries: List[str],
+        k: int = 4,
+        ef_search: Optional[int] = None
+    ) -> List[List[Document]]:
+        """
+        Perform similarity searches for several queries at once.
+        
+        The queries are embedded in a single request and the index searches
+        run on a thread pool (FAISS releases the GIL while searching).
+        
+        Args:
+            queries: Search query texts
+            k: Number of results to return per query
+            ef_search: Optional HNSW search depth; ignored for flat indexes
+            
+        Returns:
+            Lists of similar documents aligned with the input queries
+        """
+        if not queries:
+            return []
+        
+        embeddings = self.embed_queries(queries)
+        with ThreadPoolExecutor(max_workers=min(len(queries), self.max_concurrency)) as executor:
+            return list(executor.map(
+                lambda pair: self.similarity_search(
+                    pair[0],
+                    k=k,
+                    ef_search=ef_search,
+                    embedding=pair[1]
+                ),
+                zip(queries, embeddings)
+            ))
+    
     def add_documents(
         self,
-        documents: List[Document],
-        metadatas: Optional[List[Dict[str, Any]]] = None
+        documents: Iterable[Document],
+        metadatas: Optional[Iterable[Dict[str, Any]]] = None
     ) -> None:
         """
         Add new documents to an existing vector store.
         
         Args:
-            documents: List of documents to add
+            documents: Documents to add
             metadatas: Optional metadata for each document
         """
         if not self.vector_store:
-            self.create_vector_store(documents)
+            self.create_vector_store(documents, metadatas)
             return
             
         try:
-            # Extract text and metadata from documents
-            texts = [doc.page_content for doc in documents]
-            if not metadatas:
-                metadatas = [doc.metadata for doc in documents]
-                
-            self.vector_store.add_texts(texts, metadatas=metadatas)
+            metadata_iter = iter(metadatas) if metadatas else None
+            for batch in self._iter_batches(documents):
+                self.add_batch(
+                    batch,
+                    list(islice(metadata_iter, len(batch))) if metadata_iter else None
+                )
             
             if self.persist_directory:
                 self.save_vector_store()
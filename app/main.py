@@ -1,8 +1,11 @@
 """
 Main Streamlit application for PDF Q&A system.
 """
+import asyncio
+import hashlib
 import os
-import tempfile
+import queue
+import threading
 import streamlit as st
 from pathlib import Path
 from typing import Optional
@@ -11,7 +14,11 @@ from langchain_openai import ChatOpenAI
 from langchain_ollama import OllamaLLM
 
 from app.core.document import PDFProcessor
-from app.core.vectorstore import VectorStoreManager
+from app.core.vectorstore import (
+    VectorStoreManager,
+    DEFAULT_EMBEDDING_MODEL,
+    DEFAULT_EMBEDDING_DIMENSIONS
+)
 from app.tools.exact_match import ExactMatchTool
 from app.tools.semantic_qa import SemanticQATool
 from app.core.agent import QueryRouter
@@ -20,13 +27,23 @@ from app.components.chat import (
     display_chat_history,
     add_message,
     display_exact_match_result,
-    display_qa_result
+    display_qa_result,
+    update_streaming_placeholder
 )
 
+@st.cache_resource
+def load_css() -> str:
+    """Read the app stylesheet once per process."""
+    with open("app/static/styles.css") as f:
+        return f.read()
+
 # Load custom CSS
 def load_custom_css():
-    with open("app/static/styles.css") as f:
-        st.markdown(f"<style>{f.read()}</style>", unsafe_allow_html=True)
+    st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
+
+# Vector stores are persisted here, one directory per PDF content hash and
+# embedding/chunking configuration
+INDEX_CACHE_DIR = Path.home() / ".cache" / "pdfqa"
 
 # Configure page
 st.set_page_config(
@@ -42,8 +59,14 @@ load_custom_css()
 # Initialize session state
 init_session_state()
 
+@st.cache_resource
 def get_llm(model_name: str):
-    """Get LLM instance based on selection."""
+    """
+    Get LLM instance based on selection.
+    
+    Clients are stateless, so one instance (and its HTTP connection pool)
+    per model is shared by all sessions and reruns.
+    """
     if model_name.startswith("gpt"):
         return ChatOpenAI(
             model_name=model_name,
@@ -53,318 +76,149 @@ def get_llm(model_name: str):
     else:  # Ollama
         return OllamaLLM(model=model_name.lower())
 
-def init_tools(pdf_path: str, model_name: str):
+@st.cache_resource
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Start the background event loop that runs queries.
+    
+    One loop thread is shared by all sessions, so concurrent queries
+    overlap their LLM network waits instead of each blocking a thread.
+    """
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="query-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource(show_spinner="Processing PDF and creating vector store...")
+def build_index(pdf_hash: str, _pdf_bytes: bytes) -> VectorStoreManager:
+    """
+    Chunk and embed a PDF once per content hash.
+    
+    The bytes are excluded from the cache key (leading underscore), so
+    Streamlit does not hash them again and the same document uploaded
+    again reuses the existing index. The index is
+    also saved under INDEX_CACHE_DIR, so it survives app restarts; the
+    directory name includes the embedding model, dimensions and chunking
+    settings, so changing any of them builds a fresh index.
+    
+    Chunks are streamed from the parser and added in bulk batches of
+    batch_size * max_concurrency documents (see VectorStoreManager.add_batch).
+    """
+    pdf_processor = PDFProcessor()
+    index_name = (
+        f"{pdf_hash}-{DEFAULT_EMBEDDING_MODEL}-{DEFAULT_EMBEDDING_DIMENSIONS}"
+        f"-{pdf_processor.chunk_size}-{pdf_processor.chunk_overlap}"
+    )
+    vector_store = VectorStoreManager(
+        persist_directory=str(INDEX_CACHE_DIR / index_name)
+    )
+    vector_store.create_vector_store(pdf_processor.process_pdf(_pdf_bytes))
+    return vector_store
+
+def init_tools(pdf_bytes: bytes, model_name: str, pdf_hash: str):
     """Initialize Q&A tools."""
     # Initialize components
     pdf_processor = PDFProcessor()
-    vector_store = VectorStoreManager()
+    vector_store = build_index(pdf_hash, pdf_bytes)
     
-    # Process PDF and create vector store
-    with st.spinner("Processing PDF and creating vector store..."):
-        documents = pdf_processor.process_pdf(pdf_path)
-        vector_store.create_vector_store(documents)
+    # One client serves both tools; calls carry no per-call state
+    llm = get_llm(model_name)
     
     # Initialize tools
     exact_match_tool = ExactMatchTool(pdf_processor)
     semantic_qa_tool = SemanticQATool(
         vector_store=vector_store,
-        llm=get_llm(model_name)
+        llm=llm
     )
     
-    # Create router
+    # Create router; an optional local classifier skips most routing LLM calls
     return QueryRouter(
         exact_match_tool=exact_match_tool,
         semantic_qa_tool=semantic_qa_tool,
-        llm=get_llm(model_name)
+        llm=llm,
+        local_router_path=os.environ.get("LOCAL_ROUTER_PATH") or None,
+        local_router_threshold=float(os.environ.get("LOCAL_ROUTER_THRESHOLD", "0.8"))
     )
 
 def handle_query(
     router: QueryRouter,
     query: str,
-    pdf_path: str,
+    pdf_bytes: bytes,
     streaming: bool
 ):
-    """Handle user query."""
+    """
+    Handle user query.
+    
+    The prompt and answer are rendered in place in the current container
+    and stored in the history for later runs, so no rerun is needed.
+    """
     # Add user message
     add_message("user", query)
+    with st.chat_message("user", avatar="🧑"):
+        st.markdown(query)
     
-    # Create placeholder for streaming
-    placeholder = st.empty() if streaming else None
-    
-    def streaming_callback(token: str):
-        """Handle streaming tokens."""
-        if streaming:
-            st.session_state.current_response += token
-            placeholder.markdown(st.session_state.current_response)
-    
-    # Process query
-    with st.spinner("Processing your question..."):
-        result = router.process_query(
-            question=query,
-            file_path=pdf_path,
-            streaming_callback=streaming_callback if streaming else None
-        )
-    
-    # Display results
-    if result.tool_used == "EXACT_MATCH":
-        display_exact_match_result(result.result)
-        content = f"Found {result.result.count} matches"
-        sources = [
-            {"page_number": m["page_number"], "snippet": s}
-            for m in result.result.matches
-            for s in m["snippets"]
-        ]
-    else:  # SEMANTIC_QA
-        display_qa_result(
-            result.result,
-            streaming=streaming,
-            placeholder=placeholder
+    with st.chat_message("assistant", avatar="🤖"):
+        # Create placeholder for streaming
+        placeholder = st.empty() if streaming else None
+        st.session_state._response_buffer = []
+        
+        def streaming_callback(token: str):
+            """Handle streaming tokens."""
+            if streaming:
+                st.session_state._response_buffer.append(token)
+                # Plain text while streaming; markdown is rendered once complete
+                update_streaming_placeholder(placeholder, st.session_state._response_buffer)
+        
+        # Process query on the background loop; Streamlit calls only work
+        # on the script thread, so tokens are handed over through a queue
+        tokens = queue.Queue()
+        future = asyncio.run_coroutine_threadsafe(
+            router.aprocess_query(
+                question=query,
+                file_path=pdf_bytes,
+                streaming_callback=tokens.put if streaming else None
+            ),
+            get_event_loop()
         )
-        content = result.result.answer
-        sources = [
-            {
-                "page_number": doc.metadata["page_number"],
-                "content": doc.page_content
-            }
-            for doc in result.result.source_documents
-        ]
+        
+        with st.spinner("Processing your question..."):
+            # Tokens are queued before the future completes, so once it is
+            # done and the queue is empty every token has been rendered
+            while not future.done() or not tokens.empty():
+                try:
+                    streaming_callback(tokens.get(timeout=0.05))
+                except queue.Empty:
+                    pass
+            result = future.result()
+        
+        # Display results
+        if result.tool_used == "EXACT_MATCH":
+            display_exact_match_result(result.result)
+            content = f"Found {result.result.count} matches"
+            sources = [
+                {"page_number": m["page_number"], "snippet": s}
+                for m in result.result.matches
+                for s in m["snippets"]
+            ]
+        else:  # SEMANTIC_QA
+            display_qa_result(
+                result.result,
+                streaming=streaming,
+                placeholder=placeholder
+            )
+            content = result.result.answer
+            sources = [
+                {
+                    "page_number": doc.metadata["page_number"],
+                    "content": doc.page_content
+                }
+                for doc in result.result.source_documents
+            ]
     
     # Add assistant message
     add_message("assistant", content, sources)
-    
-    # Force a rerun to update the chat display
-    st.rerun()
 
 def main():
     """Main application."""
-    # Add CSS styles at the beginning
-    st.markdown(
-        """
-        <style>
-        /* Reduce Streamlit's default padding */
-        .block-container {
-            padding-top: 1rem !important;
-            padding-bottom: 0rem !important;
-        }
-        
-        /* Hide Streamlit's default header decoration */
-        header {
-            visibility: hidden;
-        }
-        
-        /* Adjust main content padding */
-        .main > div:first-child {
-            padding-top: 0rem !important;
-        }
-        
-        /* Adjust Streamlit element container height */
-        .element-container {
-            min-height: 0 !important;
-            height: auto !important;
-        }
-        
-        /* Messages container */
-        .messages-container {
-            height: 350px;
-            overflow-y: auto;
-            padding: 1rem;
-            margin-bottom: 60px;
-            border: 1px solid #e6e6e6;
-            border-radius: 8px;
-            background: white;
-        }
-        
-        /* Empty chat state */
-        .empty-chat {
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            height: 100%;
-            color: #666;
-            font-style: italic;
-            text-align: center;
-            padding: 2rem;
-        }
-        
-        /* Chat input container */
-        .chat-input-container {
-            position: fixed;
-            bottom: 0;
-            left: 0;
-            right: 0;
-            background: white;
-            padding: 0.5rem 1rem;
-            border-top: 1px solid #e6e6e6;
-            z-index: 100;
-        }
-        
-        /* Chat input styling */
-        .stChatInput {
-            width: 100% !important;
-            margin: 0 !important;
-            padding: 0.5rem !important;
-        }
-        
-        /* Chat message styling */
-        .stChatMessage {
-            margin-bottom: 0.75rem;
-            padding: 0.5rem !important;
-            background: white;
-            border-radius: 8px;
-            box-shadow: 0 1px 2px rgba(0,0,0,0.1);
-        }
-        
-        /* Source document styling */
-        .source-document {
-            margin: 0.5rem 0;
-            padding: 0.5rem;
-            background: #f8f9fa;
-            border-radius: 4px;
-            border-left: 3px solid #3c7dff;
-        }
-        
-        /* Welcome page styles */
-        .welcome-container {
-            max-width: 800px;
-            margin: 0.5rem auto;
-            text-align: center;
-            margin-bottom: 3rem;
-        }
-        
-        .welcome-icon {
-            font-size: 3.5rem;
-            margin-bottom: 1rem;
-            animation: float 3s ease-in-out infinite;
-        }
-        
-        .welcome-description {
-            color: #666;
-            font-size: 1.2rem;
-            margin-bottom: 2rem;
-            line-height: 1.6;
-        }
-        
-        .features-grid {
-            display: flex;
-            justify-content: center;
-            gap: 2rem;
-            margin: 3rem auto 0;
-            max-width: 800px;
-            padding: 0 1rem;
-        }
-        
-        .feature-card {
-            flex: 1;
-            max-width: 300px;
-            background: linear-gradient(145deg, #ffffff, #f5f7fa);
-            padding: 2rem;
-            border-radius: 16px;
-            box-shadow: 0 4px 20px rgba(0,0,0,0.05);
-            transition: all 0.3s ease;
-            text-align: center;
-            border: 1px solid rgba(255,255,255,0.8);
-        }
-        
-        .feature-card:hover {
-            transform: translateY(-5px);
-            box-shadow: 0 8px 25px rgba(0,0,0,0.1);
-        }
-        
-        .feature-icon {
-            font-size: 2.5rem;
-            margin-bottom: 1.5rem;
-            background: linear-gradient(135deg, #6b9fff, #3c7dff);
-            -webkit-background-clip: text;
-            -webkit-text-fill-color: transparent;
-            display: inline-block;
-        }
-        
-        .feature-card h3 {
-            color: #2c3e50;
-            font-size: 1.4rem;
-            margin-bottom: 1rem;
-            font-weight: 600;
-        }
-        
-        .feature-card p {
-            color: #666;
-            font-size: 1.1rem;
-            line-height: 1.5;
-            margin: 0;
-        }
-        
-        @keyframes float {
-            0% { transform: translateY(0px); }
-            50% { transform: translateY(-10px); }
-            100% { transform: translateY(0px); }
-        }
-        
-        /* Chat interface container */
-        .chat-interface {
-            display: flex;
-            flex-direction: column;
-            height: 450px;
-            border: 1px solid #e6e6e6;
-            border-radius: 8px;
-            background: white;
-            position: relative;
-            overflow: hidden;
-        }
-        
-        /* Chat input wrapper */
-        .chat-input-wrapper {
-            position: relative;
-            background: white;
-            padding: 0.5rem 1rem;
-            border-bottom: 1px solid #e6e6e6;
-            z-index: 100;
-        }
-        
-        /* Messages wrapper */
-        .messages-wrapper {
-            min-height: 0;
-            height: auto;
-            overflow-y: auto;
-            padding: 1rem;
-            display: flex;
-            flex-direction: column-reverse;
-            border: 1px solid #e6e6e6;
-            border-radius: 8px;
-            background: white;
-        }
-        
-        /* Chat input styling */
-        .stChatInput {
-            width: 100% !important;
-            margin: 0 !important;
-            padding: 0.5rem !important;
-        }
-        
-        /* Empty chat state */
-        .empty-chat {
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            height: 100%;
-            color: #666;
-            font-style: italic;
-            text-align: center;
-            padding: 2rem;
-        }
-        
-        /* Chat message styling */
-        .stChatMessage {
-            margin-bottom: 0.75rem;
-            padding: 0.5rem !important;
-            background: white;
-            border-radius: 8px;
-            box-shadow: 0 1px 2px rgba(0,0,0,0.1);
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
-
     # Sidebar
     with st.sidebar:
         st.markdown(
@@ -415,7 +269,7 @@ def main():
         # Clear chat
         if st.button("🗑️ Clear Chat"):
             st.session_state.messages = []
-            st.session_state.current_response = ""
+            st.session_state._response_buffer = []
             st.success("Chat history cleared!")
     
     # Main content
@@ -440,15 +294,17 @@ def main():
             unsafe_allow_html=True
         )
         
-        # Save uploaded file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_file:
-            tmp_file.write(uploaded_file.getvalue())
-            pdf_path = tmp_file.name
+        # The PDF is parsed straight from the uploaded bytes
+        pdf_bytes = uploaded_file.getvalue()
+        pdf_hash = hashlib.sha256(pdf_bytes).hexdigest()
         
         try:
-            # Initialize tools
-            if "router" not in st.session_state:
-                st.session_state.router = init_tools(pdf_path, model_name)
+            # Initialize tools; the router holds this session's chat memory,
+            # so it is kept in session state rather than the resource cache
+            router_key = (pdf_hash, model_name)
+            if st.session_state.get("router_key") != router_key:
+                st.session_state.router = init_tools(pdf_bytes, model_name, pdf_hash)
+                st.session_state.router_key = router_key
             
             # Chat interface
             col1, col2 = st.columns([2, 1])
@@ -467,11 +323,16 @@ def main():
                 
                 # Messages container
                 st.markdown('<div class="messages-wrapper">', unsafe_allow_html=True)
-                display_chat_history()
+                # Newest messages are shown first, so the new pair goes
+                # above the history that was already stored
+                new_messages = st.container()
+                if st.session_state.messages or not query:
+                    display_chat_history()
                 st.markdown('</div>', unsafe_allow_html=True)
                 
                 if query:
-                    handle_query(st.session_state.router, query, pdf_path, streaming)
+                    with new_messages:
+                        handle_query(st.session_state.router, query, pdf_bytes, streaming)
             
             with col2:
                 # Information panel
@@ -485,13 +346,6 @@ def main():
                 
         except Exception as e:
             st.error(f"Error processing PDF: {str(e)}")
-            
-        finally:
-            # Cleanup
-            try:
-                os.unlink(pdf_path)
-            except:
-                pass
     else:
         # Welcome page header
         st.markdown(
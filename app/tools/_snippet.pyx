@@ -0,0 +1,43 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled context snippet builder for exact-match results.
+
+Mirrors ExactMatchTool._get_context_snippet, which is used when this
+extension is not built.
+"""
+from cpython.unicode cimport PyUnicode_Substring
+
+def context_snippet(
+    str text,
+    Py_ssize_t start,
+    Py_ssize_t end,
+    Py_ssize_t context_chars=50,
+    text_length=None
+):
+    """
+    Get a text snippet around a match with context.
+    
+    Args:
+        text: Full text to extract from
+        start: Start index of match
+        end: End index of match
+        context_chars: Number of context characters on each side
+        text_length: Precomputed len(text), if available
+        
+    Returns:
+        Text snippet with context
+    """
+    cdef Py_ssize_t length = len(text) if text_length is None else text_length
+    cdef Py_ssize_t snippet_start = start - context_chars
+    cdef Py_ssize_t snippet_end = end + context_chars
+    if snippet_start < 0:
+        snippet_start = 0
+    if snippet_end > length:
+        snippet_end = length
+    
+    cdef str snippet = PyUnicode_Substring(text, snippet_start, snippet_end).strip()
+    if snippet_start > 0:
+        snippet = "..." + snippet
+    if snippet_end < length:
+        snippet = snippet + "..."
+    return snippet
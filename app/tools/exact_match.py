@@ -1,98 +1,485 @@
 """
 Tool for exact text matching and counting in PDF documents.
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+import os
 import re
 import logging
+import threading
 from dataclasses import dataclass
 
-from app.core.document import PDFProcessor
+from cachetools import LRUCache
+from langchain_core.documents import Document
+
+try:
+    import hyperscan
+except ImportError:  # optional accelerator
+    hyperscan = None
+
+try:
+    from app.tools._snippet import context_snippet
+except ImportError:  # optional accelerator (built by setup.py with Cython)
+    context_snippet = None
+
+from app.core.document import PDFProcessor, PDFSource, PageView
 
 logger = logging.getLogger(__name__)
 
+# Joins page texts in the corpus; never part of a search term
+PAGE_SEPARATOR = "\n\f"
+
+@lru_cache(maxsize=256)
+def _compile_pattern(pattern: str | bytes, flags: int) -> re.Pattern:
+    """Compile a search pattern, reusing it across repeated queries."""
+    return re.compile(pattern, flags)
+
+@lru_cache(maxsize=64)
+def _compile_hyperscan(pattern: bytes, case_sensitive: bool) -> "hyperscan.Database":
+    """Compile a search pattern into a Hyperscan database."""
+    flags = hyperscan.HS_FLAG_SOM_LEFTMOST
+    if not case_sensitive:
+        flags |= hyperscan.HS_FLAG_CASELESS
+    database = hyperscan.Database()
+    database.compile(expressions=[pattern], ids=[0], flags=[flags])
+    return database
+
+# Hyperscan scratch space may only be used by one scan at a time
+_hyperscan_local = threading.local()
+
+def _hyperscan_scratch(database: "hyperscan.Database") -> "hyperscan.Scratch":
+    """Get this thread's scratch space for a Hyperscan database."""
+    scratches = getattr(_hyperscan_local, "scratches", None)
+    if scratches is None or len(scratches) >= 64:
+        scratches = _hyperscan_local.scratches = {}
+    scratch = scratches.get(id(database))
+    if scratch is None or scratch.database is not database:
+        scratch = scratches[id(database)] = hyperscan.Scratch(database)
+    return scratch
+
 @dataclass
 class MatchResult:
     """Container for text match results."""
     count: int
     matches: List[Dict[str, Any]]
+    truncated: bool = False
+
+@dataclass(frozen=True)
+class PageCorpus:
+    """All page texts of a document joined into one buffer."""
+    text: str
+    lower_text: Optional[str]
+    ascii_bytes: Optional[bytes]
+    ascii_lower_bytes: Optional[bytes]
+    offsets: Tuple[int, ...]
+    page_texts: Tuple[str, ...]
+    page_lengths: Tuple[int, ...]
+    page_numbers: Tuple[int, ...]
+    
+    @classmethod
+    def from_pages(cls, pages: List[Document]) -> "PageCorpus":
+        """
+        Build a corpus from page documents.
+        
+        Args:
+            pages: Page documents with page numbers in their metadata
+            
+        Returns:
+            PageCorpus instance
+        """
+        return cls.from_page_views([
+            PageView(page.metadata['page_number'], page.page_content, len(page.page_content))
+            for page in pages
+        ])
     
+    @classmethod
+    def from_page_views(cls, pages: Tuple[PageView, ...] | List[PageView]) -> "PageCorpus":
+        """
+        Build a corpus with a start-offset table for each page.
+        
+        Args:
+            pages: Page views in page order
+            
+        Returns:
+            PageCorpus instance
+        """
+        page_texts = tuple(page.text for page in pages)
+        page_lengths = tuple(page.length for page in pages)
+        offsets = []
+        position = 0
+        for length in page_lengths:
+            offsets.append(position)
+            position += length + len(PAGE_SEPARATOR)
+        
+        text = PAGE_SEPARATOR.join(page_texts)
+        lower_text = text.lower()
+        is_ascii = text.isascii()
+        
+        return cls(
+            text=text,
+            # Only usable when lowercasing keeps every offset in place
+            lower_text=lower_text if len(lower_text) == len(text) else None,
+            # Byte offsets equal character offsets only for ASCII text
+            ascii_bytes=text.encode("ascii") if is_ascii else None,
+            ascii_lower_bytes=lower_text.encode("ascii") if is_ascii else None,
+            offsets=tuple(offsets),
+            page_texts=page_texts,
+            page_lengths=page_lengths,
+            page_numbers=tuple(page.number for page in pages)
+        )
+    
+    def page_index(self, position: int) -> int:
+        """Map a corpus offset to the index of the page containing it."""
+        return bisect_right(self.offsets, position) - 1
+
 class ExactMatchTool:
     """Tool for finding exact text matches in documents."""
     
-    def __init__(self, pdf_processor: PDFProcessor):
+    def __init__(
+        self,
+        pdf_processor: PDFProcessor,
+        max_workers: Optional[int] = None,
+        parallel_min_pages: int = 64
+    ):
         """
         Initialize the exact match tool.
         
         Args:
             pdf_processor: PDFProcessor instance for document handling
+            max_workers: Maximum scan threads (defaults to the CPU count)
+            parallel_min_pages: Minimum page count before scanning in parallel
         """
         self.pdf_processor = pdf_processor
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.parallel_min_pages = parallel_min_pages
+        # Corpora keyed by id() of the processor's shared page-view tuple;
+        # each entry keeps its tuple alive, so the id cannot be reused
+        self._corpora: LRUCache = LRUCache(maxsize=8)
+        self._corpora_lock = threading.Lock()
+    
+    def get_corpus(
+        self,
+        file_path: PDFSource,
+        pages: Optional[List[Document]] = None
+    ) -> PageCorpus:
+        """
+        Get the page corpus for a document.
+        
+        Args:
+            file_path: Path to the PDF file, or its bytes or a binary stream
+            pages: Optional already-loaded pages to build the corpus from
+            
+        Returns:
+            PageCorpus for the document
+        """
+        if pages is not None:
+            return PageCorpus.from_pages(pages)
+        
+        views = self.pdf_processor.load_page_views(file_path)
+        with self._corpora_lock:
+            entry = self._corpora.get(id(views))
+        if entry is None or entry[0] is not views:
+            entry = (views, PageCorpus.from_page_views(views))
+            with self._corpora_lock:
+                self._corpora[id(views)] = entry
+        return entry[1]
     
     def count_matches(
         self,
-        file_path: str,
+        file_path: PDFSource,
         query: str,
         case_sensitive: bool = False,
-        whole_word: bool = False
+        whole_word: bool = False,
+        pages: Optional[List[Document]] = None,
+        max_matches: Optional[int] = None
     ) -> MatchResult:
         """
         Count exact matches of a query in a PDF document.
         
+        The document is scanned as a single buffer of concatenated pages
+        and each hit is mapped back to its page through the offset table.
+        Large documents scanned with Hyperscan (which releases the GIL) are
+        split into contiguous page ranges scanned on a thread pool.
+        
+        When max_matches is given the scan stops as soon as that many
+        matches were found, so only the leading part of the document is
+        searched.
+        
         Args:
-            file_path: Path to the PDF file
+            file_path: Path to the PDF file, or its bytes or a binary stream
             query: Text to search for
             case_sensitive: Whether to perform case-sensitive matching
             whole_word: Whether to match whole words only
+            pages: Optional already-loaded pages (skips the corpus cache)
+            max_matches: Stop after this many matches (None scans everything)
             
         Returns:
-            MatchResult containing count and match details
+            MatchResult containing count and match details; truncated is
+            set when matches beyond max_matches were left uncounted
         """
         try:
-            pages = self.pdf_processor.load_pdf(file_path)
+            corpus = self.get_corpus(file_path, pages)
+            page_count = len(corpus.page_texts)
             
-            # Prepare regex pattern
-            if whole_word:
-                pattern = fr'\b{re.escape(query)}\b'
+            workers = min(self.max_workers, page_count // max(self.parallel_min_pages, 1))
+            if max_matches is not None:
+                # Early exit needs pages scanned in order
+                matches, truncated = self._scan_pages(
+                    corpus, 0, page_count, query, case_sensitive, whole_word, max_matches
+                )
+            elif workers > 1 and self._uses_hyperscan(corpus, query, whole_word):
+                # Split pages into contiguous ranges, one per worker
+                bounds = [page_count * i // workers for i in range(workers + 1)]
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    results = list(executor.map(
+                        lambda r: self._scan_pages(corpus, r[0], r[1], query, case_sensitive, whole_word)[0],
+                        zip(bounds, bounds[1:])
+                    ))
+                matches = [match for result in results for match in result]
+                truncated = False
             else:
-                pattern = re.escape(query)
-                
-            flags = 0 if case_sensitive else re.IGNORECASE
-            regex = re.compile(pattern, flags)
-            
-            total_count = 0
-            matches = []
-            
-            for page in pages:
-                text = page.page_content
-                page_matches = list(regex.finditer(text))
-                page_count = len(page_matches)
-                
-                if page_count > 0:
-                    matches.append({
-                        'page_number': page.metadata['page_number'],
-                        'count': page_count,
-                        'snippets': [
-                            self._get_context_snippet(text, m.start(), m.end())
-                            for m in page_matches
-                        ]
-                    })
-                    total_count += page_count
+                matches, truncated = self._scan_pages(corpus, 0, page_count, query, case_sensitive, whole_word)
             
+            total_count = sum(match['count'] for match in matches)
             return MatchResult(
                 count=total_count,
-                matches=sorted(matches, key=lambda x: x['page_number'])
+                matches=sorted(matches, key=lambda x: x['page_number']),
+                truncated=truncated
             )
             
         except Exception as e:
             logger.error(f"Error counting matches: {e}")
             raise
     
+    def _scan_pages(
+        self,
+        corpus: PageCorpus,
+        first: int,
+        last: int,
+        query: str,
+        case_sensitive: bool,
+        whole_word: bool,
+        max_matches: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Scan a contiguous range of pages and group matches by page.
+        
+        Args:
+            corpus: Document corpus to scan
+            first: Index of the first page to scan
+            last: Index one past the last page to scan
+            query: Text to search for
+            case_sensitive: Whether to perform case-sensitive matching
+            whole_word: Whether to match whole words only
+            max_matches: Stop after this many matches (None scans everything)
+            
+        Returns:
+            (match details per page in page order, whether matches beyond
+            max_matches were left unreported)
+        """
+        if first >= last:
+            return [], False
+        
+        lo = corpus.offsets[first]
+        hi = corpus.offsets[last - 1] + corpus.page_lengths[last - 1]
+        
+        # Hot loop: attributes are bound to locals once
+        get_snippet = context_snippet or self._get_context_snippet
+        offsets = corpus.offsets
+        page_texts = corpus.page_texts
+        page_lengths = corpus.page_lengths
+        separator_length = len(PAGE_SEPARATOR)
+        
+        matches = []
+        snippets = None
+        next_offset = -1  # Corpus offset where the next page starts
+        total_count = 0
+        truncated = False
+        
+        # One span past the limit tells whether the scan cut anything off
+        limit = max_matches + 1 if max_matches is not None else None
+        spans = self._find_spans(corpus, query, case_sensitive, whole_word, lo, hi, limit)
+        for start, end in spans:
+            if start >= next_offset:
+                # Spans come in document order, so pages only move forward
+                index = corpus.page_index(start)
+                offset = offsets[index]
+                text = page_texts[index]
+                length = page_lengths[index]
+                next_offset = offset + length + separator_length
+                snippets = None
+            if end - offset > length:
+                continue  # Spans a page boundary
+            if total_count == max_matches:
+                truncated = True
+                break
+            
+            if snippets is None:
+                snippets = []
+                matches.append({
+                    'page_number': corpus.page_numbers[index],
+                    'count': 0,
+                    'snippets': snippets
+                })
+            
+            snippets.append(get_snippet(text, start - offset, end - offset, text_length=length))
+            
+            total_count += 1
+        
+        for match in matches:
+            match['count'] = len(match['snippets'])
+        
+        return matches, truncated
+    
+    def _uses_literal_search(
+        self,
+        corpus: PageCorpus,
+        case_sensitive: bool,
+        whole_word: bool
+    ) -> bool:
+        """Whether a search can use the plain str.find path."""
+        return not whole_word and (case_sensitive or corpus.lower_text is not None)
+    
+    def _uses_hyperscan(self, corpus: PageCorpus, query: str, whole_word: bool) -> bool:
+        """Whether a search will be scanned with Hyperscan."""
+        return (
+            whole_word
+            and hyperscan is not None
+            and corpus.ascii_bytes is not None
+            and query.isascii()
+        )
+    
+    def _find_spans(
+        self,
+        corpus: PageCorpus,
+        query: str,
+        case_sensitive: bool,
+        whole_word: bool,
+        lo: int = 0,
+        hi: Optional[int] = None,
+        limit: Optional[int] = None
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Find non-overlapping match spans in a region of the corpus.
+        
+        Plain substring searches use str.find directly. Whole-word searches
+        on ASCII documents are scanned with Hyperscan when it is installed;
+        otherwise Python's re is used, on the bytes buffer for ASCII
+        documents. Spans are produced lazily, so a caller can stop
+        consuming them early.
+        
+        Args:
+            corpus: Document corpus to scan
+            query: Text to search for
+            case_sensitive: Whether to perform case-sensitive matching
+            whole_word: Whether to match whole words only
+            lo: Corpus offset to start scanning at
+            hi: Corpus offset to stop scanning at (defaults to the end)
+            limit: Hint that no more than this many spans will be consumed
+            
+        Returns:
+            Iterator of (start, end) corpus offsets in document order
+        """
+        if not query:
+            return iter(())
+        if hi is None:
+            hi = len(corpus.text)
+        
+        if self._uses_literal_search(corpus, case_sensitive, whole_word):
+            # Case-insensitive search scans the pre-lowercased buffer
+            if case_sensitive:
+                return self._find_spans_literal(corpus.text, query, lo, hi)
+            return self._find_spans_literal(corpus.lower_text, query.lower(), lo, hi)
+        
+        if self._uses_hyperscan(corpus, query, whole_word):
+            return iter(self._find_spans_hyperscan(
+                corpus, query, case_sensitive, whole_word, lo, hi, limit
+            ))
+        
+        # Case-insensitive search scans the pre-lowercased buffer with a
+        # plain literal pattern, which takes re's fast literal path. ASCII
+        # documents are matched as bytes (same offsets, one byte per char).
+        if corpus.ascii_bytes is not None and query.isascii():
+            if case_sensitive:
+                haystack, needle = corpus.ascii_bytes, query.encode("ascii")
+            else:
+                haystack, needle = corpus.ascii_lower_bytes, query.lower().encode("ascii")
+            flags = 0
+        elif case_sensitive:
+            haystack, needle, flags = corpus.text, query, 0
+        elif corpus.lower_text is not None:
+            haystack, needle, flags = corpus.lower_text, query.lower(), 0
+        else:
+            haystack, needle, flags = corpus.text, query, re.IGNORECASE
+        
+        # Prepare regex pattern
+        boundary = rb'\b' if isinstance(needle, bytes) else r'\b'
+        if whole_word:
+            pattern = boundary + re.escape(needle) + boundary
+        else:
+            pattern = re.escape(needle)
+            
+        regex = _compile_pattern(pattern, flags)
+        return (m.span() for m in regex.finditer(haystack, lo, hi))
+    
+    def _find_spans_literal(
+        self,
+        haystack: str,
+        needle: str,
+        lo: int,
+        hi: int
+    ) -> Iterator[Tuple[int, int]]:
+        """Find non-overlapping occurrences of a substring with str.find."""
+        size = len(needle)
+        position = haystack.find(needle, lo, hi)
+        while position != -1:
+            yield position, position + size
+            position = haystack.find(needle, position + size, hi)
+    
+    def _find_spans_hyperscan(
+        self,
+        corpus: PageCorpus,
+        query: str,
+        case_sensitive: bool,
+        whole_word: bool,
+        lo: int,
+        hi: int,
+        limit: Optional[int] = None
+    ) -> List[Tuple[int, int]]:
+        """Find match spans in an ASCII corpus region with one Hyperscan pass."""
+        pattern = re.escape(query)
+        if whole_word:
+            pattern = fr'\b{pattern}\b'
+        database = _compile_hyperscan(pattern.encode("ascii"), case_sensitive)
+        
+        spans = []
+        
+        def on_match(pattern_id, start, end, flags, context):
+            # Hyperscan reports every match end; keep re's non-overlapping semantics
+            if not spans or lo + start >= spans[-1][1]:
+                spans.append((lo + start, lo + end))
+            # A truthy return value stops the scan
+            return limit is not None and len(spans) >= limit
+        
+        try:
+            database.scan(
+                corpus.ascii_bytes[lo:hi],
+                match_event_handler=on_match,
+                scratch=_hyperscan_scratch(database)
+            )
+        except hyperscan.ScanTerminated:
+            pass  # Stopped at the limit
+        return spans
+    
     def _get_context_snippet(
         self,
         text: str,
         start: int,
         end: int,
-        context_chars: int = 50
+        context_chars: int = 50,
+        text_length: Optional[int] = None
     ) -> str:
         """
         Get a text snippet around a match with context.
@@ -102,14 +489,17 @@ class ExactMatchTool:
             start: Start index of match
             end: End index of match
             context_chars: Number of context characters on each side
+            text_length: Precomputed len(text), if available
             
         Returns:
             Text snippet with context
         """
+        if text_length is None:
+            text_length = len(text)
         snippet_start = max(0, start - context_chars)
-        snippet_end = min(len(text), end + context_chars)
+        snippet_end = min(text_length, end + context_chars)
         
         prefix = '...' if snippet_start > 0 else ''
-        suffix = '...' if snippet_end < len(text) else ''
+        suffix = '...' if snippet_end < text_length else ''
         
         return f"{prefix}{text[snippet_start:snippet_end].strip()}{suffix}" 
\ No newline at end of file
@@ -1,10 +1,15 @@
 """
 Semantic Q&A tool for answering questions about PDF content.
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+import asyncio
 import logging
+import re
+import time
 from dataclasses import dataclass
 
+import numpy as np
+
 from langchain_core.language_models import BaseLLM
 from langchain_core.memory import BaseMemory
 from langchain_core.chat_history import BaseChatMessageHistory
@@ -13,12 +18,22 @@ from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.runnables import RunnablePassthrough, RunnableSequence
 from langchain_core.callbacks import StreamingStdOutCallbackHandler
-from langchain.memory import ConversationBufferMemory
+from langchain.memory import ConversationBufferWindowMemory
 
 from app.core.vectorstore import VectorStoreManager
 
 logger = logging.getLogger(__name__)
 
+# Words that refer back to an earlier turn ("what about its accuracy?")
+FOLLOW_UP_REFERENCES = re.compile(
+    r"\b(?:it|its|they|them|their|this|that|these|those|he|she|his|her|"
+    r"also|else|above|previous|earlier|same|what\s+about|how\s+about)\b",
+    re.IGNORECASE
+)
+
+# Questions this short usually lean on the previous one for context
+FOLLOW_UP_MAX_WORDS = 5
+
 @dataclass
 class QAResult:
     """Container for Q&A results."""
@@ -49,18 +64,56 @@ class SemanticQATool:
     def __init__(
         self,
         vector_store: VectorStoreManager,
-        llm: BaseLLM
+        llm: BaseLLM,
+        cache_threshold: Optional[float] = 0.95,
+        cache_ttl: float = 3600.0,
+        cache_max_size: int = 256,
+        follow_up_docs: int = 2,
+        history_turns: int = 6
     ):
         """
         Initialize the semantic QA tool.
         
+        Answers are cached by question embedding: a question whose cosine
+        similarity to an earlier one reaches cache_threshold is answered
+        from the cache without calling the LLM. Follow-up questions depend
+        on the chat history, so they are neither answered from nor added to
+        the cache.
+        
+        Only the last history_turns question/answer pairs are put into the
+        prompt, so its size (and the LLM latency) stays constant as the
+        conversation grows. The trade-off is that older turns are forgotten
+        entirely; questions referring back further than that lose context.
+        
         Args:
             vector_store: Vector store manager
             llm: Language model for Q&A
+            cache_threshold: Minimum cosine similarity for a cache hit
+                (None disables the cache)
+            cache_ttl: Seconds a cached answer stays valid
+            cache_max_size: Maximum number of cached answers (least recently
+                used answers are evicted first)
+            follow_up_docs: Maximum number of extra prompt-context documents
+                retrieved for the previous question when a question looks
+                like a follow-up (0 disables this); they are not listed in
+                the result's source documents
+            history_turns: Number of recent exchanges included in the prompt
         """
         self.vector_store = vector_store
         self.llm = llm
-        self.memory = ConversationBufferMemory(
+        self.cache_threshold = cache_threshold
+        self.cache_ttl = cache_ttl
+        self.cache_max_size = cache_max_size
+        self.follow_up_docs = follow_up_docs
+        
+        # Semantic cache: normalized question embeddings (one row per
+        # answer) with parallel creation and last-use timestamps
+        self._cache_embs: Optional[np.ndarray] = None
+        self._cache_answers: List[QAResult] = []
+        self._cache_created = np.empty(0)
+        self._cache_used = np.empty(0)
+        self.memory = ConversationBufferWindowMemory(
+            k=history_turns,
             return_messages=True,
             memory_key="chat_history",
             output_key="output"
@@ -81,6 +134,167 @@ class SemanticQATool:
         
         self.prompt = ChatPromptTemplate.from_template(template)
     
+    def _cache_remove(self, keep: np.ndarray) -> None:
+        """Keep only the cache entries selected by a boolean mask."""
+        self._cache_embs = self._cache_embs[keep]
+        self._cache_created = self._cache_created[keep]
+        self._cache_used = self._cache_used[keep]
+        self._cache_answers = [a for a, k in zip(self._cache_answers, keep) if k]
+    
+    def _cache_lookup(self, embedding: np.ndarray) -> Optional[QAResult]:
+        """
+        Find a cached answer for a question embedding.
+        
+        Args:
+            embedding: Normalized question embedding
+            
+        Returns:
+            Cached QAResult, or None on a miss
+        """
+        if not self._cache_answers:
+            return None
+        
+        now = time.monotonic()
+        expired = now - self._cache_created >= self.cache_ttl
+        if expired.any():
+            self._cache_remove(~expired)
+            if not self._cache_answers:
+                return None
+        
+        # Rows are normalized, so the dot product is the cosine similarity
+        similarities = self._cache_embs @ embedding
+        best = int(similarities.argmax())
+        if similarities[best] < self.cache_threshold:
+            return None
+        
+        self._cache_used[best] = now
+        return self._cache_answers[best]
+    
+    def _cache_store(self, embedding: np.ndarray, result: QAResult) -> None:
+        """
+        Add an answer to the semantic cache.
+        
+        Args:
+            embedding: Normalized question embedding
+            result: Answer to cache
+        """
+        if self.cache_max_size <= 0:
+            return
+        
+        if len(self._cache_answers) >= self.cache_max_size:
+            keep = np.ones(len(self._cache_answers), dtype=bool)
+            keep[int(self._cache_used.argmin())] = False
+            self._cache_remove(keep)
+        
+        now = time.monotonic()
+        row = embedding[np.newaxis, :]
+        if self._cache_embs is None or not self._cache_answers:
+            self._cache_embs = row
+        else:
+            self._cache_embs = np.vstack([self._cache_embs, row])
+        self._cache_created = np.append(self._cache_created, now)
+        self._cache_used = np.append(self._cache_used, now)
+        self._cache_answers.append(result)
+    
+    def clear_cache(self) -> None:
+        """Clear the semantic answer cache."""
+        self._cache_embs = None
+        self._cache_answers = []
+        self._cache_created = np.empty(0)
+        self._cache_used = np.empty(0)
+    
+    def _last_question(self) -> Optional[str]:
+        """Get the most recent question in the conversation memory."""
+        for message in reversed(self.memory.chat_memory.messages):
+            if isinstance(message, HumanMessage):
+                return message.content
+        return None
+    
+    def _is_follow_up(self, question: str) -> bool:
+        """Whether a question looks like it depends on the previous one."""
+        return (
+            len(question.split()) <= FOLLOW_UP_MAX_WORDS
+            or FOLLOW_UP_REFERENCES.search(question) is not None
+        )
+    
+    def _prepare(
+        self,
+        question: str,
+        streaming_callback: Optional[callable] = None
+    ) -> Tuple[Optional[QAResult], List[Any], List[Any], Optional[np.ndarray]]:
+        """
+        Check the semantic cache and build the prompt for a question.
+        
+        Args:
+            question: User's question
+            streaming_callback: Optional callback, sent the full answer on a
+                cache hit
+            
+        Returns:
+            (cached result or None, source documents, prompt messages,
+            normalized question embedding to cache the answer under, or None)
+        """
+        previous = self._last_question()
+        follow_up = previous is not None and self._is_follow_up(question)
+        
+        embedding = normalized = None
+        if self.cache_threshold is not None and not follow_up:
+            # Embed once; the vector is reused for retrieval on a miss
+            embedding = self.vector_store.embed_query(question)
+            normalized = np.asarray(embedding, dtype=np.float32)
+            normalized /= np.linalg.norm(normalized) or 1.0
+            
+            cached = self._cache_lookup(normalized)
+            if cached is not None:
+                logger.debug("Semantic cache hit")
+                if streaming_callback:
+                    streaming_callback(cached.answer)
+                self.memory.save_context(
+                    {"input": question},
+                    {"output": cached.answer}
+                )
+                return cached, [], [], None
+        
+        # Get relevant documents; follow-up questions also get prompt context
+        # for the previous question, embedded and searched in the same batch
+        if follow_up and self.follow_up_docs > 0 and previous != question:
+            docs, previous_docs = self.vector_store.similarity_search_batch([question, previous])
+            context = docs + [doc for doc in previous_docs if doc not in docs][:self.follow_up_docs]
+        else:
+            docs = context = self.vector_store.similarity_search(question, embedding=embedding)
+        
+        # Format messages
+        messages = self.prompt.format_messages(
+            context=context,
+            chat_history=self.memory.load_memory_variables({})["chat_history"],
+            question=question
+        )
+        
+        return None, docs, messages, normalized
+    
+    def _finish(
+        self,
+        question: str,
+        answer: str,
+        docs: List[Any],
+        normalized: Optional[np.ndarray]
+    ) -> QAResult:
+        """Save an answer to memory and the semantic cache."""
+        # Save to memory
+        self.memory.save_context(
+            {"input": question},
+            {"output": answer}
+        )
+        
+        result = QAResult(
+            answer=answer,
+            source_documents=docs
+        )
+        if normalized is not None:
+            self._cache_store(normalized, result)
+        
+        return result
+    
     def ask(
         self,
         question: str,
@@ -97,45 +311,72 @@ class SemanticQATool:
             QAResult containing answer and source documents
         """
         try:
-            # Get relevant documents
-            docs = self.vector_store.similarity_search(question)
-            
-            # Format messages
-            messages = self.prompt.format_messages(
-                context=docs,
-                chat_history=self.memory.load_memory_variables({})["chat_history"],
-                question=question
-            )
+            cached, docs, messages, normalized = self._prepare(question, streaming_callback)
+            if cached is not None:
+                return cached
             
             # Generate answer
             if streaming_callback:
                 # Create streaming handler
                 streaming_handler = StreamingCallbackHandler(streaming_callback)
                 
-                # Generate response with streaming
-                response = ""
+                # Generate response with streaming; tokens are buffered in a
+                # list and joined once instead of concatenated per token
                 for chunk in self.llm.stream(messages):
-                    if hasattr(chunk, 'content'):
-                        response += chunk.content
-                    else:
-                        response += str(chunk)
+                    token = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    streaming_handler.on_llm_new_token(token)
                 
-                answer = response
+                answer = streaming_handler.get_buffer()
             else:
                 # For non-streaming, use direct invoke
                 response = self.llm.invoke(messages)
                 answer = response.content
             
-            # Save to memory
-            self.memory.save_context(
-                {"input": question},
-                {"output": answer}
-            )
+            return self._finish(question, answer, docs, normalized)
             
-            return QAResult(
-                answer=answer,
-                source_documents=docs
+        except Exception as e:
+            logger.error(f"Error in semantic QA: {e}")
+            raise
+    
+    async def aask(
+        self,
+        question: str,
+        streaming_callback: Optional[callable] = None
+    ) -> QAResult:
+        """
+        Ask a question about the PDF content without blocking the event loop.
+        
+        Retrieval runs in a worker thread and the answer is generated with
+        the LLM's async API, so concurrent questions overlap their network
+        waits.
+        
+        Args:
+            question: User's question
+            streaming_callback: Optional callback for streaming responses
+            
+        Returns:
+            QAResult containing answer and source documents
+        """
+        try:
+            cached, docs, messages, normalized = await asyncio.to_thread(
+                self._prepare, question, streaming_callback
             )
+            if cached is not None:
+                return cached
+            
+            # Generate answer
+            if streaming_callback:
+                streaming_handler = StreamingCallbackHandler(streaming_callback)
+                async for chunk in self.llm.astream(messages):
+                    token = chunk.content if hasattr(chunk, 'content') else str(chunk)
+                    streaming_handler.on_llm_new_token(token)
+                
+                answer = streaming_handler.get_buffer()
+            else:
+                response = await self.llm.ainvoke(messages)
+                answer = response.content if hasattr(response, 'content') else str(response)
+            
+            return self._finish(question, answer, docs, normalized)
             
         except Exception as e:
             logger.error(f"Error in semantic QA: {e}")
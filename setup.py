@@ -3,15 +3,26 @@ Setup configuration for PDF Q&A System.
 """
 from setuptools import setup, find_packages
 
+try:
+    from Cython.Build import cythonize
+except ImportError:  # optional accelerator
+    ext_modules = []
+else:
+    ext_modules = cythonize(["app/tools/_snippet.pyx"], language_level=3)
+
 setup(
     name="pdf-qa-app-with-langchain",
     version="0.1.0",
     packages=find_packages(),
     include_package_data=True,
+    ext_modules=ext_modules,
     install_requires=[
         line.strip()
         for line in open("requirements.txt")
         if line.strip() and not line.startswith("#")
     ],
+    extras_require={
+        "local-router": ["onnxruntime>=1.16"],
+    },
     python_requires=">=3.8",
 ) 
\ No newline at end of file